@@ -2,11 +2,17 @@ import os
 import uuid
 import yt_dlp
 import logging
+from yt_dlp.utils import download_range_func
 
 # Configure logging to keep track of what's happening
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Full quality, used for the segment that ends up in the Short
+HIGH_QUALITY_FORMAT = 'bestvideo[height<=1080][ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best'
+# Smallest watchable file with audio, used only for AI analysis
+PROXY_FORMAT = 'worst[height>=240][ext=mp4]/worst'
+
 class VideoDownloader:
     def __init__(self, download_dir="downloads"):
         self.download_dir = download_dir
@@ -14,22 +20,28 @@ class VideoDownloader:
         if not os.path.exists(self.download_dir):
             os.makedirs(self.download_dir)
 
-    def download_video(self, video_url: str) -> dict:
+    def _download(self, video_url: str, extra_opts: dict) -> dict:
         """
-        Downloads a video from YouTube using yt-dlp.
+        Runs yt-dlp with the given format/range options.
         Returns a dictionary with the file path and metadata.
+
+        The file is written to disk rather than piped into ffmpeg: the cut
+        points only exist after Gemini has analyzed the whole video.
+
+        yt-dlp downloads to "<file>.part" (and merges via a temp file), only
+        renaming to the returned path once complete, so callers never see a
+        partial file as long as they read after this returns.
         """
         try:
             # Generate a unique filename to avoid collisions
             unique_id = str(uuid.uuid4())
             output_template = os.path.join(self.download_dir, f"{unique_id}.%(ext)s")
 
-            # yt-dlp options (Consistent with standard high-quality extraction)
             ydl_opts = {
-                'format': 'bestvideo[height<=1080][ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best',
                 'outtmpl': output_template,
                 'quiet': True,
                 'no_warnings': True,
+                **extra_opts,
             }
 
             logger.info(f"Starting download for URL: {video_url}")
@@ -37,10 +49,10 @@ class VideoDownloader:
             with yt_dlp.YoutubeDL(ydl_opts) as ydl:
                 # Extract info first to get metadata
                 info_dict = ydl.extract_info(video_url, download=True)
-                
+
                 # Get the actual filename created
                 filename = ydl.prepare_filename(info_dict)
-                
+
                 # Retrieve video title and duration for the AI context later
                 video_title = info_dict.get('title', 'Unknown Title')
                 duration = info_dict.get('duration', 0)
@@ -60,4 +72,34 @@ class VideoDownloader:
             return {
                 "status": "error",
                 "message": str(e)
-            }
\ No newline at end of file
+            }
+
+    def download_video(self, video_url: str) -> dict:
+        """
+        Downloads the full video from YouTube at up to 1080p.
+        """
+        # yt-dlp options (Consistent with standard high-quality extraction)
+        return self._download(video_url, {'format': HIGH_QUALITY_FORMAT})
+
+    def download_proxy(self, video_url: str) -> dict:
+        """
+        Downloads a low-resolution copy for Gemini.
+        Picking timestamps doesn't need 1080p, and the proxy is a fraction
+        of the bytes to download and to upload for analysis.
+        """
+        return self._download(video_url, {'format': PROXY_FORMAT})
+
+    def download_section(self, video_url: str, start_seconds: float, end_seconds: float) -> dict:
+        """
+        Downloads only [start_seconds, end_seconds] of the video at full quality.
+        The range is stream-copied (no re-encode), so the file begins at the
+        keyframe at or before start_seconds. -copyts keeps the source
+        timestamps: the file's start time is that keyframe's position in the
+        original video, which is how the editor finds the real cut offset.
+        """
+        logger.info(f"Downloading section {start_seconds:.3f}s - {end_seconds:.3f}s")
+        return self._download(video_url, {
+            'format': HIGH_QUALITY_FORMAT,
+            'download_ranges': download_range_func(None, [(start_seconds, end_seconds)]),
+            'external_downloader_args': {'ffmpeg_o': ['-copyts']},
+        })
@@ -8,64 +8,286 @@ import uuid
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Hardware H.264 encoders in order of preference.
+# libx264 is the CPU fallback when none of these is usable.
+HW_ENCODERS = ["h264_nvenc", "h264_qsv", "h264_videotoolbox"]
+
+# Fragmented MP4: the moov header comes first and fragments are only ever
+# appended, so the file can be uploaded while it is still being written.
+FRAGMENTED_MP4_FLAGS = "+frag_keyframe+empty_moov+default_base_moof"
+
+# Outputs are written to "<file>.part" and renamed into place once complete,
+# so a crash never leaves a half-written file under the final name.
+PART_SUFFIX = ".part"
+
+# How close (in seconds) the cut start must be to a keyframe to skip re-encoding
+KEYFRAME_TOLERANCE = 0.5
+
+# get_video_info results are cached next to the video in "<file>.probe.json".
+# Bump the version whenever the cached fields change.
+PROBE_SUFFIX = ".probe.json"
+PROBE_CACHE_VERSION = 3
+
+def parse_timestamp(timestamp: str) -> float:
+    """Converts 'HH:MM:SS' (or 'MM:SS' / 'SS', optionally fractional) to seconds."""
+    seconds = 0.0
+    for part in timestamp.strip().split(":"):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
 class VideoEditor:
+    # Detected once per process and shared by every VideoEditor instance
+    _encoder = None
+
     def __init__(self, output_dir="processed"):
         self.output_dir = output_dir
         if not os.path.exists(self.output_dir):
             os.makedirs(self.output_dir)
 
-    def get_video_info(self, file_path):
+        if VideoEditor._encoder is None:
+            VideoEditor._encoder = self._detect_encoder()
+        self.encoder = VideoEditor._encoder
+        logger.info(f"Using video encoder: {self.encoder}")
+
+    def _detect_encoder(self) -> str:
+        """
+        Picks the fastest available H.264 encoder.
+        An encoder listed by ffmpeg is only used if a 1-frame test encode works,
+        since most ffmpeg builds ship NVENC/QSV even on machines without the hardware.
+        """
+        try:
+            result = subprocess.run(
+                ["ffmpeg", "-hide_banner", "-encoders"],
+                capture_output=True, text=True, check=True
+            )
+        except Exception as e:
+            logger.warning(f"Could not list FFmpeg encoders, using libx264: {e}")
+            return "libx264"
+
+        for encoder in HW_ENCODERS:
+            if encoder not in result.stdout:
+                continue
+            test_cmd = [
+                "ffmpeg", "-hide_banner", "-v", "error",
+                "-f", "lavfi", "-i", "color=black:s=256x256",
+                "-frames:v", "1",
+                "-c:v", encoder,
+                "-f", "null", "-"
+            ]
+            if subprocess.run(test_cmd, capture_output=True).returncode == 0:
+                return encoder
+
+        return "libx264"
+
+    def _encoder_args(self) -> list:
+        """Video codec arguments for the detected encoder."""
+        if self.encoder == "h264_nvenc":
+            # Constant-quality VBR, roughly equivalent to x264 crf 18-19
+            return ["-c:v", "h264_nvenc", "-preset", "p4", "-rc", "vbr", "-cq", "19", "-b:v", "0"]
+        if self.encoder == "h264_qsv":
+            return ["-c:v", "h264_qsv", "-preset", "medium", "-global_quality", "19"]
+        if self.encoder == "h264_videotoolbox":
+            return ["-c:v", "h264_videotoolbox", "-q:v", "65"]
+        return ["-c:v", "libx264", "-crf", "18", "-preset", "slow"]
+
+    def _load_cached_info(self, sidecar: str, file_path: str):
+        """Returns the cached probe result, or None if missing or stale."""
+        try:
+            if os.path.getmtime(sidecar) < os.path.getmtime(file_path):
+                return None
+            with open(sidecar) as f:
+                cached = json.load(f)
+            if cached.get("version") != PROBE_CACHE_VERSION:
+                return None
+            return cached
+        except (OSError, ValueError):
+            return None
+
+    def get_video_info(self, file_path) -> dict:
         """
-        Uses ffprobe to get video dimensions.
+        Uses ffprobe to get video dimensions, keyframe timestamps and the audio codec.
+        Keyframes come from packet flags, so the file is only demuxed, never decoded.
+        They are relative to the file's start_time, the same timeline -ss uses.
+        The result is cached in a sidecar file so retries and re-edits skip ffprobe.
         """
+        sidecar = file_path + PROBE_SUFFIX
+        cached = self._load_cached_info(sidecar, file_path)
+        if cached:
+            logger.info(f"Using cached probe: {sidecar}")
+            return cached
+
+        # One ffprobe for everything: all streams (video + audio) and the
+        # packets, which are filtered down to the video stream below
         cmd = [
             "ffprobe", 
             "-v", "error", 
-            "-select_streams", "v:0", 
-            "-show_entries", "stream=width,height", 
+            "-show_entries",
+            "stream=index,codec_type,codec_name,width,height,r_frame_rate,nb_frames"
+            ":packet=stream_index,pts_time,flags:format=start_time", 
             "-of", "json", 
             file_path
         ]
         try:
             result = subprocess.run(cmd, capture_output=True, text=True, check=True)
             info = json.loads(result.stdout)
-            width = int(info['streams'][0]['width'])
-            height = int(info['streams'][0]['height'])
-            return width, height
+            streams = info.get("streams", [])
+            stream = next(s for s in streams if s.get("codec_type") == "video")
+            audio_stream = next((s for s in streams if s.get("codec_type") == "audio"), None)
+            # Non-zero for files that keep their source timestamps (e.g. section downloads)
+            start_time = float(info.get("format", {}).get("start_time") or 0)
+            keyframes = sorted(
+                float(packet["pts_time"]) - start_time
+                for packet in info.get("packets", [])
+                if packet.get("stream_index") == stream["index"]
+                and "K" in packet.get("flags", "")
+                and packet.get("pts_time") not in (None, "N/A")
+            )
+            video_info = {
+                "version": PROBE_CACHE_VERSION,
+                "width": int(stream['width']),
+                "height": int(stream['height']),
+                "frame_rate": stream.get('r_frame_rate'),
+                "nb_frames": stream.get('nb_frames'),
+                "start_time": start_time,
+                "keyframes": keyframes,
+                # None if the file has no audio track
+                "a_codec": audio_stream.get("codec_name") if audio_stream else None
+            }
         except Exception as e:
             logger.error(f"Error getting video info: {e}")
             raise
 
-    def process_video(self, file_path: str, start_time: str, end_time: str) -> dict:
+        # The cache is an optimization; failing to write it is not an error
+        try:
+            with open(sidecar + PART_SUFFIX, "w") as f:
+                json.dump(video_info, f)
+            os.replace(sidecar + PART_SUFFIX, sidecar)
+        except OSError as e:
+            logger.warning(f"Could not write probe cache {sidecar}: {e}")
+
+        return video_info
+
+    def _stream_copy(self, file_path: str, start_seconds: float, duration: float,
+                     output_path: str, a_codec: str = None) -> dict:
+        """
+        Trims without re-encoding video. Starts exactly on the keyframe so the
+        first GOP is complete and decodable, and copied audio starts there too.
+        AAC audio (YouTube's m4a) is copied; anything else is re-encoded to AAC.
+        """
+        if a_codec in ("aac", None):
+            audio_args = ["-c:a", "copy"]
+        else:
+            audio_args = ["-c:a", "aac", "-b:a", "192k"]
+        cmd = [
+            "ffmpeg",
+            "-ss", f"{start_seconds:.3f}",
+            "-i", file_path,
+            "-t", f"{duration:.3f}",
+            "-c:v", "copy",
+            *audio_args,
+            "-avoid_negative_ts", "make_zero",
+        ]
+        return self._run_ffmpeg(cmd, output_path)
+
+    def _run_ffmpeg(self, cmd: list, output_path: str) -> dict:
+        """
+        Runs an ffmpeg command (without output) writing a fragmented MP4 to output_path.
+        Output goes through stdout so ffmpeg sees a non-seekable stream and
+        can never go back to rewrite bytes a tailing reader already sent.
+        While running, the file is output_path + PART_SUFFIX.
+        """
+        cmd = cmd + ["-movflags", FRAGMENTED_MP4_FLAGS, "-f", "mp4", "pipe:1"]
+        tmp_path = output_path + PART_SUFFIX
+
+        logger.info(f"Running FFmpeg command: {' '.join(cmd)} > {tmp_path}")
+        try:
+            with open(tmp_path, "wb") as output:
+                subprocess.run(cmd, stdout=output, check=True)
+
+            if not os.path.getsize(tmp_path):
+                raise FileNotFoundError("FFmpeg finished but output file is empty.")
+
+            os.replace(tmp_path, output_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        logger.info(f"Processing complete: {output_path}")
+
+        return {
+            "status": "success",
+            "file_path": output_path
+        }
+
+    def new_output_path(self) -> str:
+        """Returns a fresh path in the output directory for a processed Short."""
+        unique_id = str(uuid.uuid4())
+        return os.path.join(self.output_dir, f"{unique_id}_short.mp4")
+
+    def process_video(self, file_path: str, start_time: str, end_time: str,
+                      info: dict = None, output_path: str = None) -> dict:
         """
         Cuts the video and ensures it is vertical (9:16).
+        Pass the result of get_video_info as `info` if the file was already probed,
+        and `output_path` (see new_output_path) to know the destination in advance.
         """
         try:
             # Generate output filename
-            unique_id = str(uuid.uuid4())
-            output_path = os.path.join(self.output_dir, f"{unique_id}_short.mp4")
+            if output_path is None:
+                output_path = self.new_output_path()
             
             # 1. Analyze Input Dimensions
-            width, height = self.get_video_info(file_path)
+            if info is None:
+                info = self.get_video_info(file_path)
+            width, height = info["width"], info["height"]
             logger.info(f"Input Dimensions: {width}x{height}")
             
             is_vertical = height > width
+
+            start_seconds = parse_timestamp(start_time)
+            duration = parse_timestamp(end_time) - start_seconds
+            if duration <= 0:
+                raise ValueError(f"End time {end_time} is not after start time {start_time}.")
+
+            # Fast path: vertical source cut on a keyframe needs no re-encode at all
+            if is_vertical:
+                nearest_kf = min(info["keyframes"], key=lambda kf: abs(kf - start_seconds), default=None)
+                if nearest_kf is not None and abs(start_seconds - nearest_kf) < KEYFRAME_TOLERANCE:
+                    logger.info(f"Start is on a keyframe ({nearest_kf:.3f}s). Using stream copy.")
+                    duration += start_seconds - nearest_kf
+                    return self._stream_copy(file_path, nearest_kf, duration, output_path, info.get("a_codec"))
             
             # 2. Build FFmpeg Command
-            # Base command: input file, start time, end time
-            cmd = [
-                "ffmpeg",
-                "-y",               # Overwrite output file if exists
+            # Base command: (GPU decode), start time, input file, duration
+            # -ss before -i seeks with the container index instead of decoding
+            # every frame up to start_time. When re-encoding, ffmpeg still trims
+            # the frames between that keyframe and start_time, so the cut stays
+            # frame-accurate and the quality settings below apply unchanged.
+            cmd = ["ffmpeg"]
+
+            if self.encoder == "h264_nvenc":
+                cmd.extend(["-hwaccel", "cuda"])
+                if is_vertical:
+                    # No CPU filter needed, so keep decoded frames on the GPU
+                    # and skip the device->host copy per frame
+                    cmd.extend(["-hwaccel_output_format", "cuda"])
+
+            cmd.extend([
+                "-ss", f"{start_seconds:.3f}",
                 "-i", file_path,
-                "-ss", start_time,
-                "-to", end_time,
-                "-c:v", "libx264",  # Re-encode video
-		"-crf", "18",
-		"-preset", "slow",
+                "-t", f"{duration:.3f}",
+            ])
+            cmd.extend(self._encoder_args())  # Re-encode video
+            # Audio is always re-encoded here: a copied stream would start at the
+            # demuxer's seek point (the keyframe before start_time), not at the
+            # frame-accurate video cut, and the fragmented output has no edit list
+            # to hide that. Audio is only copied on the keyframe-aligned
+            # _stream_copy path.
+            cmd.extend([
                 "-c:a", "aac",      # Re-encode audio
-                "-strict", "experimental",
                 "-b:a", "192k"      # Audio bitrate
-            ]
+            ])
 
             # 3. Add Crop Filters if needed
             if is_vertical:
@@ -80,26 +302,12 @@ class VideoEditor:
                 # x = (iw-ow)/2 -> Center the crop horizontally
                 # y = 0         -> Start from top
                 
-                # We also use 'trunc(...)*2' to ensure width is an even number (required by libx264)
+                # We also use 'trunc(...)*2' to ensure width is an even number (required by H.264 encoders)
                 crop_filter = f"crop=trunc(ih*9/16/2)*2:ih:(iw-ow)/2:0"
                 cmd.extend(["-vf", crop_filter])
 
-            # Add output path
-            cmd.append(output_path)
-
             # 4. Run FFmpeg
-            logger.info(f"Running FFmpeg command: {' '.join(cmd)}")
-            subprocess.run(cmd, check=True)
-
-            if not os.path.exists(output_path):
-                raise FileNotFoundError("FFmpeg finished but output file is missing.")
-
-            logger.info(f"Processing complete: {output_path}")
-
-            return {
-                "status": "success",
-                "file_path": output_path
-            }
+            return self._run_ffmpeg(cmd, output_path)
 
         except subprocess.CalledProcessError as e:
             logger.error(f"FFmpeg failed: {e}")
@@ -1,7 +1,13 @@
 import os
-import time
 import json
+import mmap
+import time
+import asyncio
 import logging
+import functools
+import mimetypes
+import threading
+import httplib2
 import typing_extensions as typing
 import google.generativeai as genai
 from google.ai.generativelanguage_v1beta.types import content
@@ -10,6 +16,19 @@ from google.ai.generativelanguage_v1beta.types import content
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Gemini processing poll: start fast, back off, never wait forever
+POLL_INITIAL_DELAY = 1.0
+POLL_MAX_DELAY = 15.0
+POLL_BACKOFF = 1.5
+PROCESSING_TIMEOUT = 600  # seconds
+
+# Resumable upload to the Gemini Files API, sent in fixed-size chunks
+# (must be a multiple of 256 KB) so memory use doesn't grow with the video
+GEMINI_UPLOAD_URL = "https://generativelanguage.googleapis.com/upload/v1beta/files"
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+# Per-chunk retries on 5xx/429/network errors, resuming at the server's offset
+UPLOAD_RETRIES = 5
+
 # Define the expected JSON structure for Type Safety
 class VideoSegment(typing.TypedDict):
     start_time: str
@@ -18,33 +37,177 @@ class VideoSegment(typing.TypedDict):
     reasoning: str
     suggested_title: str
 
+@functools.lru_cache(maxsize=None)
+def _configure(api_key: str):
+    """Configures the Gemini client once per process (per API key)."""
+    genai.configure(api_key=api_key)
+
+@functools.lru_cache(maxsize=None)
+def _get_model(model_name: str, schema: type) -> genai.GenerativeModel:
+    """
+    Returns a shared model that outputs strict JSON matching `schema`.
+    Built once per (model, schema) instead of on every analysis.
+    """
+    generation_config = genai.GenerationConfig(
+        response_mime_type="application/json",
+        response_schema=schema
+    )
+    return genai.GenerativeModel(
+        model_name=model_name,
+        generation_config=generation_config
+    )
+
 class AIProcessor:
     def __init__(self, api_key: str):
         if not api_key:
             raise ValueError("API Key is required for AIProcessor")
         
-        genai.configure(api_key=api_key)
+        _configure(api_key)
         
+        self.api_key = api_key
         self.model_name = "gemini-2.5-flash"
-        
-        # We configure the model to output strict JSON
-        self.generation_config = genai.GenerationConfig(
-            response_mime_type="application/json",
-            response_schema=VideoSegment
+        self._local = threading.local()
+
+    def _get_http(self):
+        """
+        Returns this thread's HTTP client for the REST upload.
+        httplib2 is not thread-safe, so each thread gets its own; keeping it
+        per thread reuses keep-alive connections across uploads.
+        """
+        http = getattr(self._local, "http", None)
+        if http is None:
+            http = httplib2.Http()
+            self._local.http = http
+        return http
+
+    def _query_upload(self, http, upload_url: str):
+        """
+        Asks the server how much of an interrupted upload it has.
+        Returns (bytes_received, file_name); file_name is set if the upload
+        was already finalized and only the response got lost.
+        """
+        response, resp_body = http.request(
+            upload_url,
+            "POST",
+            headers={"Content-Length": "0", "X-Goog-Upload-Command": "query"}
         )
+        if response.status != 200:
+            raise RuntimeError(f"Gemini upload status query failed ({response.status}): {resp_body[:200]}")
+        if response.get("x-goog-upload-status") == "final":
+            return None, json.loads(resp_body)["file"]["name"]
+        return int(response.get("x-goog-upload-size-received", 0)), None
+
+    def _upload_resumable(self, file_path: str) -> str:
+        """
+        Uploads a file with the Files API resumable protocol and returns its name.
+        genai.upload_file sends the whole file as one in-memory request body;
+        here each chunk is a view into an mmap of the file, so only one
+        chunk's worth of pages is touched at a time.
+        A failed chunk is retried from the offset the server reports.
+        """
+        size = os.path.getsize(file_path)
+        mime_type = mimetypes.guess_type(file_path)[0] or "video/mp4"
+        http = self._get_http()
 
-    def upload_file(self, file_path: str):
+        # 1. Start the session
+        response, resp_body = http.request(
+            f"{GEMINI_UPLOAD_URL}?key={self.api_key}",
+            "POST",
+            body=json.dumps({"file": {"display_name": os.path.basename(file_path)}}),
+            headers={
+                "Content-Type": "application/json",
+                "X-Goog-Upload-Protocol": "resumable",
+                "X-Goog-Upload-Command": "start",
+                "X-Goog-Upload-Header-Content-Length": str(size),
+                "X-Goog-Upload-Header-Content-Type": mime_type,
+            }
+        )
+        if response.status != 200:
+            raise RuntimeError(f"Could not start Gemini upload ({response.status}): {resp_body[:200]}")
+        upload_url = response["x-goog-upload-url"]
+
+        # 2. Send the chunks, finalizing with the last one
+        with open(file_path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            view = memoryview(mm)
+            try:
+                offset = 0
+                retries = 0
+                while True:
+                    chunk = view[offset:offset + UPLOAD_CHUNK_SIZE]
+                    chunk_len = len(chunk)
+                    is_last = offset + chunk_len >= size
+                    try:
+                        try:
+                            response, resp_body = http.request(
+                                upload_url,
+                                "POST",
+                                body=chunk,
+                                headers={
+                                    "Content-Length": str(chunk_len),
+                                    "X-Goog-Upload-Offset": str(offset),
+                                    "X-Goog-Upload-Command": "upload, finalize" if is_last else "upload",
+                                }
+                            )
+                        finally:
+                            # The mmap can only be closed once no slices of it are alive
+                            chunk.release()
+                        if response.status == 200:
+                            if is_last:
+                                return json.loads(resp_body)["file"]["name"]
+                            offset += chunk_len
+                            retries = 0
+                            continue
+                        # Only server errors and rate limits are worth retrying
+                        if response.status < 500 and response.status != 429:
+                            raise RuntimeError(
+                                f"Gemini upload failed at byte {offset} ({response.status}): {resp_body[:200]}"
+                            )
+                        error = f"HTTP {response.status}"
+                    except (OSError, httplib2.HttpLib2Error) as e:
+                        error = str(e)
+
+                    retries += 1
+                    if retries > UPLOAD_RETRIES:
+                        raise RuntimeError(f"Gemini upload failed at byte {offset} after {UPLOAD_RETRIES} retries: {error}")
+                    delay = min(2 ** retries, 30)
+                    logger.warning(f"Gemini upload chunk at byte {offset} failed ({error}), retrying in {delay}s...")
+                    time.sleep(delay)
+
+                    # Resume from what the server actually has
+                    try:
+                        received, file_name = self._query_upload(http, upload_url)
+                    except (OSError, httplib2.HttpLib2Error, RuntimeError) as e:
+                        logger.warning(f"Gemini upload status query failed: {e}")
+                        continue
+                    if file_name:
+                        return file_name
+                    offset = received
+            finally:
+                view.release()
+                mm.close()
+
+    async def upload_file(self, file_path: str):
         """Uploads file to Gemini and waits for processing to complete."""
         logger.info(f"Uploading file to Gemini: {file_path}")
         
+        video_file = None
         try:
-            video_file = genai.upload_file(path=file_path)
+            # The upload and the SDK are blocking, so run them in a thread
+            file_name = await asyncio.to_thread(self._upload_resumable, file_path)
+            video_file = await asyncio.to_thread(genai.get_file, file_name)
             
             # Wait for processing (Gemini needs time to 'watch' the video)
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + PROCESSING_TIMEOUT
+            delay = POLL_INITIAL_DELAY
             while video_file.state.name == "PROCESSING":
-                logger.info("Waiting for video to process...")
-                time.sleep(2)
-                video_file = genai.get_file(video_file.name)
+                if loop.time() >= deadline:
+                    raise TimeoutError(f"Video still processing after {PROCESSING_TIMEOUT}s: {video_file.name}")
+                logger.info(f"Waiting {delay:.1f}s for video to process...")
+                await asyncio.sleep(delay)
+                video_file = await asyncio.to_thread(genai.get_file, video_file.name)
+                delay = min(delay * POLL_BACKOFF, POLL_MAX_DELAY)
 
             if video_file.state.name == "FAILED":
                 raise ValueError("Video processing failed on Google servers.")
@@ -54,24 +217,29 @@ class AIProcessor:
 
         except Exception as e:
             logger.error(f"Upload failed: {str(e)}")
+            # The caller never receives a failed/timed-out file, so remove it here
+            if video_file:
+                try:
+                    await asyncio.to_thread(self.delete_file, video_file)
+                except Exception as cleanup_error:
+                    logger.error(f"Failed to delete {video_file.name}: {cleanup_error}")
             raise
 
-    def get_timestamps(self, file_path: str) -> dict:
+    def delete_file(self, video_file):
+        """Removes an uploaded video from Google Cloud."""
+        logger.info("Cleaning up file from Google Cloud...")
+        genai.delete_file(video_file.name)
+
+    def get_timestamps(self, video_file) -> dict:
         """
-        Orchestrates the analysis: Upload -> Analyze -> Return JSON
+        Analyzes a video already uploaded with upload_file and returns JSON.
+        The caller owns the uploaded file and should delete_file it afterwards.
         """
-        video_file = None
         try:
-            # 1. Upload
-            video_file = self.upload_file(file_path)
-
-            # 2. Initialize Model
-            model = genai.GenerativeModel(
-                model_name=self.model_name,
-                generation_config=self.generation_config
-            )
+            # 1. Get the (shared) Model
+            model = _get_model(self.model_name, VideoSegment)
 
-            # 3. The Prompt
+            # 2. The Prompt
             prompt = (
                 "You are an expert video editor for viral YouTube Shorts. "
                 "Analyze this video and identify the single most engaging, contiguous segment "
@@ -84,7 +252,7 @@ class AIProcessor:
             logger.info("Sending prompt to Gemini...")
             response = model.generate_content([video_file, prompt])
 
-            # 4. Parse Response
+            # 3. Parse Response
             # Since we forced JSON mode, response.text should be valid JSON
             result = json.loads(response.text)
             logger.info(f"AI Analysis Complete: {result}")
@@ -99,10 +267,4 @@ class AIProcessor:
             return {
                 "status": "error",
                 "message": str(e)
-            }
-        
-        finally:
-            # 5. Cleanup
-            if video_file:
-                logger.info("Cleaning up file from Google Cloud...")
-                genai.delete_file(video_file.name)
\ No newline at end of file
+            }
\ No newline at end of file
@@ -1,14 +1,180 @@
 import os
+import io
+import mmap
+import time
 import logging
+import threading
+import contextlib
+import httplib2
+import google_auth_httplib2
 from google.oauth2.credentials import Credentials
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
+from googleapiclient.http import MediaIoBaseUpload, MediaUpload
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Resumable upload chunk size (must be a multiple of 256 KB)
+CHUNK_SIZE = 8 * 1024 * 1024
+# Per-chunk retries on 5xx/network errors; the upload resumes where it stopped
+CHUNK_RETRIES = 5
+
+class MmapStream(io.RawIOBase):
+    """
+    Read-only file stream over an mmap.
+    read() returns memoryview slices of the mapping, so upload chunks come
+    straight from the page cache instead of being copied into new bytes objects.
+    """
+    def __init__(self, file_obj):
+        self._mmap = mmap.mmap(file_obj.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self._pos = offset
+        elif whence == io.SEEK_CUR:
+            self._pos += offset
+        elif whence == io.SEEK_END:
+            self._pos = len(self._view) + offset
+        return self._pos
+
+    def read(self, size=-1):
+        end = len(self._view) if size is None or size < 0 else self._pos + size
+        chunk = self._view[self._pos:end]
+        self._pos += len(chunk)
+        return chunk
+
+    def close(self):
+        if not self.closed:
+            self._view.release()
+            try:
+                self._mmap.close()
+            except BufferError:
+                # A chunk slice is still referenced; the mapping is freed once it is collected
+                pass
+        super().close()
+
+class GrowingFileUpload(MediaUpload):
+    """
+    Resumable upload of a file another thread/process is still writing.
+    `writer` is a concurrent.futures.Future that resolves to the final path
+    once the file is complete (or raises if writing failed). Until then the
+    total size is reported as unknown and each chunk is sent as soon as it
+    is on disk - but only while at least one more byte follows it, so the
+    last chunk always goes out with the real total size (a full chunk sent
+    as "/*" that turns out to be the end would leave an empty final range).
+    The file is read through one descriptor opened when it first appears,
+    so the writer may rename it into place (e.g. from ".part") mid-upload.
+    Like MmapStream, each chunk is a memoryview of a read-only mapping of
+    just that range, not a copy.
+    """
+    POLL_INTERVAL = 0.5  # seconds between checks for new bytes
+
+    def __init__(self, file_path, writer, mimetype='video/mp4', chunksize=CHUNK_SIZE):
+        self._file_path = file_path
+        self._writer = writer
+        self._mimetype = mimetype
+        self._chunksize = chunksize
+        self._fd = None
+        self._sent = 0  # end of the last chunk handed to the client
+        self._chunk_map = None
+        self._chunk_view = None
+
+    def chunksize(self):
+        return self._chunksize
+
+    def mimetype(self):
+        return self._mimetype
+
+    def resumable(self):
+        return True
+
+    def has_stream(self):
+        return False
+
+    def _writer_finished(self):
+        if not self._writer.done():
+            return False
+        # Re-raises the writer's error, aborting the upload before it is finalized
+        self._writer.result()
+        return True
+
+    def _open(self):
+        """Opens the file once it exists; returns False while it doesn't yet."""
+        if self._fd is not None:
+            return True
+        try:
+            self._fd = os.open(self._file_path, os.O_RDONLY)
+        except FileNotFoundError:
+            if not self._writer_finished():
+                return False
+            # Already complete and renamed before we got to open it
+            self._fd = os.open(self._writer.result(), os.O_RDONLY)
+        return True
+
+    def _written(self):
+        return os.fstat(self._fd).st_size if self._open() else 0
+
+    def _release_chunk(self):
+        if self._chunk_view is not None:
+            self._chunk_view.release()
+            try:
+                self._chunk_map.close()
+            except BufferError:
+                # The client still references the chunk; freed once it is collected
+                pass
+            self._chunk_map = self._chunk_view = None
+
+    def close(self):
+        self._release_chunk()
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        self._sent = 0  # end of the last chunk handed to the client
+        self._chunk_map = None
+        self._chunk_view = None
+
+    def size(self):
+        # The client reads size() once per chunk, before getbytes(), so this is
+        # where we wait: either more than a full chunk is on disk (send it as
+        # "/*"), or the writer is done and the tail goes out with its size.
+        while True:
+            if self._writer_finished():
+                return self._written()
+            if self._written() - self._sent > self._chunksize:
+                return None
+            time.sleep(self.POLL_INTERVAL)
+
+    def getbytes(self, begin, length):
+        # size() has already waited until these bytes are on disk
+        self._open()
+        self._release_chunk()
+        end = min(begin + length, self._written())
+        self._sent = max(end, begin)
+        if end <= begin:
+            return b""
+        # Only map what is already written; mapping past EOF would SIGBUS
+        aligned = begin - begin % mmap.ALLOCATIONGRANULARITY
+        self._chunk_map = mmap.mmap(self._fd, end - aligned, access=mmap.ACCESS_READ, offset=aligned)
+        self._chunk_view = memoryview(self._chunk_map)[begin - aligned:]
+        return self._chunk_view
+
 class DriveUploader:
+    """
+    Build once per process and share: the Drive client and its credentials
+    are reused across uploads (the access token refreshes itself).
+    """
     def __init__(self):
         # We load these from Environment Variables for security
         self.client_id = os.getenv("GOOGLE_CLIENT_ID")
@@ -19,9 +185,14 @@ class DriveUploader:
         # If None, it uploads to the root folder.
         self.parent_folder_id = os.getenv("GOOGLE_DRIVE_FOLDER_ID")
 
+        # Make uploads readable by anyone with the link (Optional)
+        self.share_publicly = os.getenv("GOOGLE_DRIVE_SHARE_PUBLIC", "").lower() == "true"
+
         if not all([self.client_id, self.client_secret, self.refresh_token]):
             raise ValueError("Missing Google OAuth credentials in environment variables.")
 
+        self.credentials = None
+        self._local = threading.local()
         self.service = self._authenticate()
 
     def _authenticate(self):
@@ -29,23 +200,75 @@ class DriveUploader:
         Uses the Refresh Token to get a fresh Access Token automatically.
         """
         try:
-            creds = Credentials(
+            self.credentials = Credentials(
                 None, # Access token is None, we will refresh it
                 refresh_token=self.refresh_token,
                 token_uri="https://oauth2.googleapis.com/token",
                 client_id=self.client_id,
                 client_secret=self.client_secret
             )
-            return build('drive', 'v3', credentials=creds)
+            # static_discovery loads the API description bundled with the
+            # library instead of fetching it over HTTP on every build
+            return build(
+                'drive', 'v3',
+                credentials=self.credentials,
+                cache_discovery=False,
+                static_discovery=True
+            )
         except Exception as e:
             logger.error(f"Authentication failed: {str(e)}")
             raise
 
-    def upload_file(self, file_path: str, video_title: str) -> dict:
+    def _get_http(self):
+        """
+        Returns this thread's authorized transport.
+        httplib2 connections are not thread-safe, so each thread gets its own;
+        keeping it per thread (instead of per upload) lets the worker's thread
+        pool reuse open keep-alive connections to Drive across uploads
+        instead of paying a TLS handshake every time.
+        """
+        http = getattr(self._local, "http", None)
+        if http is None:
+            http = google_auth_httplib2.AuthorizedHttp(self.credentials, http=httplib2.Http())
+            self._local.http = http
+        return http
+
+    def _share_publicly(self, file_id: str, http) -> dict:
+        """
+        Grants 'anyone' read access and fetches the direct download link.
+        Both metadata calls go out in one batch request (one round trip);
+        only the media upload itself can't be batched.
+        """
+        results = {}
+
+        def callback(request_id, response, exception):
+            if exception:
+                raise exception
+            results[request_id] = response
+
+        batch = self.service.new_batch_http_request(callback=callback)
+        batch.add(
+            self.service.permissions().create(
+                fileId=file_id,
+                body={'role': 'reader', 'type': 'anyone'}
+            ),
+            request_id='permission'
+        )
+        batch.add(
+            self.service.files().get(fileId=file_id, fields='webContentLink'),
+            request_id='file'
+        )
+        batch.execute(http=http)
+
+        return results['file']
+
+    def upload_file(self, file_path: str, video_title: str, writer=None) -> dict:
         """
         Uploads a video to Google Drive and returns the public link.
+        If the file is still being written, pass the writer's
+        concurrent.futures.Future as `writer` to upload while it grows.
         """
-        if not os.path.exists(file_path):
+        if writer is None and not os.path.exists(file_path):
             raise FileNotFoundError(f"File to upload not found: {file_path}")
 
         try:
@@ -61,28 +284,54 @@ class DriveUploader:
             if self.parent_folder_id:
                 file_metadata['parents'] = [self.parent_folder_id]
 
-            # Media content (Resumable uploads are safer for video)
-            media = MediaFileUpload(
-                file_path, 
-                mimetype='video/mp4',
-                resumable=True
-            )
-
             logger.info(f"Starting upload: {file_name}")
-            
-            # Execute upload
-            file = self.service.files().create(
-                body=file_metadata,
-                media_body=media,
-                fields='id, webViewLink'
-            ).execute()
+
+            with contextlib.ExitStack() as stack:
+                # Media content (Resumable uploads are safer for video)
+                if writer is None:
+                    f = stack.enter_context(open(file_path, 'rb'))
+                    stream = stack.enter_context(MmapStream(f))
+                    media = MediaIoBaseUpload(
+                        stream,
+                        mimetype='video/mp4',
+                        chunksize=CHUNK_SIZE,
+                        resumable=True
+                    )
+                else:
+                    media = GrowingFileUpload(file_path, writer, mimetype='video/mp4', chunksize=CHUNK_SIZE)
+                    stack.callback(media.close)
+
+                # Execute upload, one chunk per request on the same resumable session
+                request = self.service.files().create(
+                    body=file_metadata,
+                    media_body=media,
+                    fields='id, webViewLink'
+                )
+                http = self._get_http()
+                file = None
+                while file is None:
+                    status, file = request.next_chunk(http=http, num_retries=CHUNK_RETRIES)
+                    if status and status.total_size:
+                        logger.info(f"Uploaded {int(status.progress() * 100)}%")
+                    elif status:
+                        logger.info(f"Uploaded {status.resumable_progress // (1024 * 1024)} MB")
+
+            download_link = None
+            if self.share_publicly:
+                # The Short is already in Drive: a sharing failure (e.g. a domain
+                # policy forbidding 'anyone' links) must not fail the upload
+                try:
+                    download_link = self._share_publicly(file.get('id'), http).get('webContentLink')
+                except Exception as e:
+                    logger.error(f"Could not share file {file.get('id')} publicly: {str(e)}")
 
             logger.info(f"Upload complete. File ID: {file.get('id')}")
 
             return {
                 "status": "success",
                 "file_id": file.get('id'),
-                "drive_link": file.get('webViewLink')
+                "drive_link": file.get('webViewLink'),
+                "download_link": download_link
             }
 
         except Exception as e:
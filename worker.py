@@ -0,0 +1,215 @@
+import os
+import asyncio
+import logging
+import concurrent.futures
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Import our "Worker" services
+from services.downloader import VideoDownloader
+from services.intelligence import AIProcessor
+from services.editor import VideoEditor, parse_timestamp, PROBE_SUFFIX, PART_SUFFIX
+from services.uploader import DriveUploader
+from services.config import GEMINI_API_KEY, REDIS_SETTINGS
+
+# Configure Logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("Worker")
+
+# --- Configuration ---
+if not GEMINI_API_KEY:
+    logger.warning("GOOGLE_API_KEY not found in environment variables!")
+
+# FFmpeg is CPU-bound: running more encodes than half the cores just thrashes.
+# Each slot holds two threads (encode + tailing Drive upload), so at most
+# cpu_count threads of the default pool (min(32, cpu_count + 4)) are ever
+# tied up here, leaving room for the download/AI stages of other jobs.
+# Each encode is still its own ffmpeg process: a running ffmpeg can't be
+# handed a new output file, and ~0.3s of startup is noise next to the encode.
+ENCODE_SLOTS = asyncio.Semaphore(max(1, (os.cpu_count() or 1) // 2))
+
+# --- Helper: Cleanup Function ---
+def cleanup_files(file_paths: list):
+    """Deletes temporary files to save disk space on Railway."""
+    for path in file_paths:
+        if path and os.path.exists(path):
+            try:
+                os.remove(path)
+                logger.info(f"Cleaned up file: {path}")
+            except Exception as e:
+                logger.error(f"Failed to delete {path}: {e}")
+
+# --- Lifecycle: Shared Services ---
+async def startup(ctx):
+    """
+    Builds the services once per worker process. Auth, Drive API discovery
+    and encoder detection then happen at boot instead of on every job.
+    """
+    try:
+        ctx["downloader"] = VideoDownloader()
+        ctx["ai_processor"] = AIProcessor(api_key=GEMINI_API_KEY)
+        ctx["editor"] = VideoEditor()
+        ctx["uploader"] = DriveUploader()
+    except Exception as e:
+        logger.error(f"Service Initialization Failed: {e}")
+        raise Exception(f"Service Start Failed: {str(e)}")
+
+# --- The Pipeline Job ---
+async def run_pipeline(ctx, youtube_url: str) -> dict:
+    """
+    Orchestrates the full pipeline:
+    Download Proxy -> AI Analyze -> Download Segment -> Edit -> Upload.
+    Every stage is blocking, so each runs in a thread to keep the worker's
+    event loop free for other jobs.
+    """
+    logger.info(f"Starting job {ctx.get('job_id')} for: {youtube_url}")
+
+    # Services are shared by every job (see startup)
+    downloader = ctx["downloader"]
+    ai_processor = ctx["ai_processor"]
+    editor = ctx["editor"]
+    uploader = ctx["uploader"]
+
+    # Track files for cleanup
+    proxy_file = None
+    section_file = None
+    processed_file = None
+    gemini_file = None
+
+    try:
+        # 1. DOWNLOADER (low-res proxy, only used for analysis)
+        logger.info(">>> Step 1: Downloading proxy...")
+        dl_result = await asyncio.to_thread(downloader.download_proxy, youtube_url)
+        if dl_result.get("status") == "error":
+            raise Exception(f"Download failed: {dl_result.get('message')}")
+
+        proxy_file = dl_result["file_path"]
+        video_title = dl_result.get("title", "Untitled Video")
+        logger.info(f"Download complete: {proxy_file}")
+
+        # 2. INTELLIGENCE (Gemini 2.5 Flash)
+        logger.info(">>> Step 2: AI Analysis...")
+        gemini_file = await ai_processor.upload_file(proxy_file)
+
+        ai_result = await asyncio.to_thread(ai_processor.get_timestamps, gemini_file)
+        if ai_result.get("status") == "error":
+            raise Exception(f"AI Analysis failed: {ai_result.get('message')}")
+
+        # Extract data from AI response
+        ai_data = ai_result["data"]
+        start_time = ai_data["start_time"]
+        end_time = ai_data["end_time"]
+        viral_title = ai_data.get("suggested_title", video_title)
+        logger.info(f"AI Selected: {start_time} to {end_time} | Title: {viral_title}")
+
+        # 3. DOWNLOADER (full quality, selected segment only)
+        logger.info(">>> Step 3: Downloading segment...")
+        start_seconds = parse_timestamp(start_time)
+        end_seconds = parse_timestamp(end_time)
+        section_result = await asyncio.to_thread(
+            downloader.download_section, youtube_url, start_seconds, end_seconds
+        )
+        if section_result.get("status") == "error":
+            raise Exception(f"Segment download failed: {section_result.get('message')}")
+
+        section_file = section_result["file_path"]
+        logger.info(f"Segment download complete: {section_file}")
+
+        # The segment was stream-copied, so it begins at the keyframe before
+        # start_time; its start_time (source timeline) gives the real offset.
+        section_info = await asyncio.to_thread(editor.get_video_info, section_file)
+        cut_offset = start_seconds - section_info["start_time"]
+        if cut_offset < 0 or cut_offset > end_seconds - start_seconds:
+            # Source timestamps were not preserved; assume the segment starts at start_time
+            logger.warning(f"Unexpected segment start {section_info['start_time']:.3f}s, cutting from 0")
+            cut_offset = 0.0
+        cut_end = cut_offset + end_seconds - start_seconds
+
+        # 4. EDITOR (FFmpeg) + 5. UPLOADER (Google Drive), overlapped:
+        # the editor writes a fragmented MP4 to "<file>.part" and the uploader
+        # sends it as it grows. encode_done tells the uploader when the file is
+        # complete and renamed to its final path (or broken).
+        processed_file = editor.new_output_path()
+        encode_done = concurrent.futures.Future()
+
+        async def encode():
+            try:
+                result = await asyncio.to_thread(
+                    editor.process_video, section_file, f"{cut_offset:.3f}", f"{cut_end:.3f}",
+                    section_info, processed_file
+                )
+                if result.get("status") == "error":
+                    encode_done.set_exception(Exception(result.get("message")))
+                else:
+                    encode_done.set_result(processed_file)
+                return result
+            finally:
+                # Never leave the uploader waiting on an encode that died
+                if not encode_done.done():
+                    encode_done.set_exception(Exception("Encoding was interrupted."))
+
+        # The slot covers both threads: the uploader sleep-polls its thread until
+        # the encode is done, so starting it before the encode holds a slot could
+        # fill the thread pool with pollers and leave no thread to encode with.
+        async with ENCODE_SLOTS:
+            logger.info(">>> Step 4/5: Editing and Uploading...")
+            encode_task = asyncio.create_task(encode())
+            upload_result = await asyncio.to_thread(
+                uploader.upload_file, processed_file + PART_SUFFIX, viral_title, encode_done
+            )
+            edit_result = await encode_task
+
+        if edit_result.get("status") == "error":
+            raise Exception(f"Editing failed: {edit_result.get('message')}")
+        logger.info(f"Editing complete: {processed_file}")
+
+        if upload_result.get("status") == "error":
+            raise Exception(f"Upload failed: {upload_result.get('message')}")
+
+        drive_link = upload_result["drive_link"]
+        logger.info(f"Pipeline Success! Link: {drive_link}")
+
+        # Job Result (served by GET /jobs/{job_id})
+        return {
+            "status": "success",
+            "original_video": video_title,
+            "generated_short_title": viral_title,
+            "drive_link": drive_link,
+            # Only set when GOOGLE_DRIVE_SHARE_PUBLIC is enabled
+            "download_link": upload_result.get("download_link"),
+            "timestamps": {
+                "start": start_time,
+                "end": end_time
+            },
+            "reasoning": ai_data.get("reasoning", "")
+        }
+
+    except Exception as e:
+        logger.error(f"Pipeline Failed: {str(e)}")
+        raise
+
+    finally:
+        # Cleanup runs regardless of success or failure
+        if gemini_file:
+            try:
+                await asyncio.to_thread(ai_processor.delete_file, gemini_file)
+            except Exception as e:
+                logger.error(f"Failed to delete Gemini file {gemini_file.name}: {e}")
+        cleanup_files([
+            proxy_file,
+            section_file,
+            section_file and section_file + PROBE_SUFFIX,
+            processed_file
+        ])
+
+# --- Worker Entry Point ---
+# Run with: arq worker.WorkerSettings
+class WorkerSettings:
+    functions = [run_pipeline]
+    on_startup = startup
+    redis_settings = REDIS_SETTINGS
+    # Long videos can take a while to download, analyze and encode
+    job_timeout = 3600
+    max_tries = 1